@@ -10,16 +10,30 @@ Supports:
 """
 
 import os
-import json
+import signal
 import time
-import random
 import logging
+import numpy as np
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Full, Queue
 from threading import Thread
-from flask import Flask
-from kafka import KafkaProducer
+from confluent_kafka import Producer
 from faker import Faker
 
+# JSON encoder: orjson returns bytes directly; fall back to stdlib json if unavailable
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    import json
+
+    # Built once: events are acyclic, and compact separators match orjson's output
+    _json_encode = json.JSONEncoder(check_circular=False, separators=(',', ':')).encode
+
+    def _dumps(value):
+        return _json_encode(value).encode('utf-8')
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,19 +52,41 @@ EXPLICIT_TOPIC = os.getenv('TOPIC')  # optional explicit topic name (used for si
 
 # Streams: use consistent names
 DEFAULT_STREAMS = 'symptom_report,clinic_visit,environmental_conditions'
-EVENT_STREAMS = [s.strip() for s in os.getenv('EVENT_STREAMS', DEFAULT_STREAMS).split(',') if s.strip()]
+EVENT_STREAMS = tuple(s.strip() for s in os.getenv('EVENT_STREAMS', DEFAULT_STREAMS).split(',') if s.strip())
+
+# Payload encoding: json (default) or msgpack (smaller and faster to encode)
+EVENT_FORMAT = os.getenv('EVENT_FORMAT', 'json').strip().lower()
+SUPPORTED_FORMATS = ('json', 'msgpack')
+if EVENT_FORMAT == 'msgpack':
+    import msgpack
+    _encode_event = msgpack.packb
+else:
+    _encode_event = _dumps
 
 # Regions
-REGIONS = [r.strip() for r in os.getenv('REGIONS', 'Boston,Cambridge,Somerville,Brookline,Newton').split(',') if r.strip()]
+REGIONS = tuple(r.strip() for r in os.getenv('REGIONS', 'Boston,Cambridge,Somerville,Brookline,Newton').split(',') if r.strip())
 
 # Optional deterministic seed
 RANDOM_SEED = os.getenv('RANDOM_SEED')
+seed_val = None
 if RANDOM_SEED is not None:
     try:
         seed_val = int(RANDOM_SEED)
     except ValueError:
         seed_val = sum(ord(c) for c in RANDOM_SEED)
-    random.seed(seed_val)
+
+# Vectorized RNG for event fields, drawn POOL_SIZE events at a time
+rng = np.random.default_rng(seed_val)
+POOL_SIZE = 4096
+
+# Max events buffered per team ahead of its sender thread; when full, that team's events are dropped
+SEND_QUEUE_SIZE = 10000
+
+# Overall budget for stop(), kept under Kubernetes' default 30s termination grace period
+STOP_TIMEOUT_SEC = float(os.getenv('STOP_TIMEOUT_SEC', '25'))
+
+# Seconds between production stats log lines
+STATS_LOG_INTERVAL_SEC = 10
 
 
 """Kafka bootstrap configuration"""
@@ -71,59 +107,189 @@ logger.info(f"Loaded {len(TEAM_KAFKA_MAPPING)} team Kafka mappings")
 # Initialize Faker
 fake = Faker()
 
-# Health check Flask app
-app = Flask(__name__)
+# Health check endpoints; /ready never changes after startup, so its body is prebuilt
+READY_RESPONSE = _dumps({'status': 'ready', 'teams': len(TEAM_KAFKA_MAPPING), 'rate': EVENT_RATE_PER_SEC})
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """Serves the /health and /ready probe endpoints"""
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/health':
+            body = _dumps({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
+        elif path == '/ready':
+            body = READY_RESPONSE
+        else:
+            self.send_error(404)
+            return
 
-@app.route('/health')
-def health():
-    return {'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
-@app.route('/ready')
-def ready():
-    return {'status': 'ready', 'teams': len(TEAM_KAFKA_MAPPING), 'rate': EVENT_RATE_PER_SEC}
+    def log_message(self, format, *args):
+        # Probes hit these endpoints every few seconds; keep them out of the INFO logs
+        logger.debug(f"{self.address_string()} - {format % args}")
 
 
 class EventGenerator:
     """Generates synthetic health events"""
 
-    SYMPTOMS = [
+    SYMPTOMS = (
         'fever', 'cough', 'fatigue', 'headache', 'sore_throat',
         'shortness_of_breath', 'body_aches', 'loss_of_taste',
         'loss_of_smell', 'nausea', 'diarrhea', 'congestion'
-    ]
+    )
 
-    VISIT_TYPES = [
+    VISIT_TYPES = (
         'routine_checkup', 'emergency', 'follow_up',
         'vaccination', 'diagnostic_test', 'consultation'
-    ]
+    )
 
-    CONDITIONS = [
+    CONDITIONS = (
         'temperature', 'humidity', 'air_quality_index',
         'pollen_count', 'uv_index'
-    ]
+    )
+
+    SEVERITIES = ('mild', 'moderate', 'severe')
+
+    REPORT_CHANNELS = ('mobile_app', 'web_portal', 'phone_hotline')
+
+    # Numeric fields drawn together on each pool refill: name -> (low, high), inclusive
+    INT_FIELDS = {
+        'patient_id': (10000, 99999),
+        'visit_id': (100000, 999999),
+        'clinic_id': (1, 50),
+        'station_id': (1, 20),
+        'diagnosis_code': (100, 999),
+        'age': (1, 90),
+        'duration_days': (1, 14),
+        'humidity_percent': (30, 95),
+        'air_quality_index': (0, 200),
+        'pollen_count': (0, 500),
+        'uv_index': (0, 11),
+        'symptom_count': (1, 4),
+    }
+
+    FLOAT_FIELDS = {
+        'body_temperature_f': (97.0, 104.0),
+        'air_temperature_f': (20.0, 95.0),
+        'wind_speed_mph': (0.0, 25.0),
+    }
+
+    BOOL_FIELDS = ('prescribed_medication', 'follow_up_required')
 
     def __init__(self):
-        self.producers = {}  # Map of team_id (or 'shared') -> KafkaProducer
+        self.producers = {}  # Map of team_id (or 'shared') -> confluent_kafka.Producer
+        self.topics = {}  # Map of team_id (or 'shared') -> topic name
+        self.queues = {}  # Map of team_id (or 'shared') -> bounded Queue of (payload, key) to send
+        self.workers = []
+        self.production_thread = None
+        self._teams = []  # Team ids in worker order, frozen at start()
+        self._failed = []  # Cumulative failures per team, aligned with _teams; written only by that team's worker
+        self._dropped = []  # Cumulative queue-full drops per team, aligned with _teams; written only by produce_events
+        self._failures_logged = []  # _failure_totals() as of the last "Failed sends" log
         self.running = False
         self.total_sent = 0
-        self.last_log_time = time.time()
+        self._ts_second = None  # Epoch second the cached timestamp prefix belongs to
+        self._ts_prefix = ''
+        self._stream_pool = []  # Pre-drawn stream types, consumed from the end
+        self._generators = {  # Map of stream type -> event generator method
+            'symptom_report': self.generate_symptom_report,
+            'clinic_visit': self.generate_clinic_visit,
+            'environmental_conditions': self.generate_environmental_condition,
+        }
+        self._refill_pool()
+
+        # Reusable event dicts, one per stream; generators overwrite the fields in place.
+        # Safe because each event is serialized before the next one is generated.
+        self._symptom_event = self._event_template('symptom_report', (
+            'timestamp', 'patient_id', 'age', 'region', 'symptoms',
+            'severity', 'duration_days', 'reported_via'
+        ))
+        self._clinic_event = self._event_template('clinic_visit', (
+            'timestamp', 'visit_id', 'patient_id', 'clinic_id', 'region', 'visit_type',
+            'primary_complaint', 'temperature_f', 'diagnosis_code',
+            'prescribed_medication', 'follow_up_required'
+        ))
+        self._environment_event = self._event_template('environmental_conditions', (
+            'timestamp', 'region', 'station_id', 'temperature_f', 'humidity_percent',
+            'air_quality_index', 'pollen_count', 'uv_index', 'wind_speed_mph'
+        ))
+
+    @staticmethod
+    def _event_template(event_type, fields):
+        """Build an event dict with its fields in output order, followed by common metadata"""
+        return {
+            'event_type': event_type,
+            **dict.fromkeys(fields),
+            'source': 'event-generator',
+            'schema_version': '1.0'
+        }
+
+    def _refill_pool(self, n=POOL_SIZE):
+        """Pre-draw random fields for the next n events in a handful of NumPy calls"""
+        # One call per dtype covers every numeric field, with per-column bounds
+        int_lows, int_highs = zip(*self.INT_FIELDS.values())
+        ints = rng.integers(int_lows, int_highs, size=(n, len(int_lows)), endpoint=True)
+        float_lows, float_highs = zip(*self.FLOAT_FIELDS.values())
+        floats = rng.uniform(float_lows, float_highs, size=(n, len(float_lows))).round(1)
+        bools = rng.integers(0, 2, size=(n, len(self.BOOL_FIELDS)), dtype=bool)
+
+        # Up to 4 distinct symptoms per row, drawn as random index orderings and resolved
+        # to names in one gather; generators keep the first symptom_count of each row
+        symptom_picks = rng.random((n, len(self.SYMPTOMS))).argsort(axis=1)[:, :4]
+        symptom_names = np.array(self.SYMPTOMS)[symptom_picks]
+        self._pool = {
+            **dict(zip(self.INT_FIELDS, ints.T.tolist())),
+            **dict(zip(self.FLOAT_FIELDS, floats.T.tolist())),
+            **dict(zip(self.BOOL_FIELDS, bools.T.tolist())),
+            'symptoms': symptom_names.tolist(),
+            'region': rng.choice(REGIONS, n).tolist(),
+            'severity': rng.choice(self.SEVERITIES, n).tolist(),
+            'reported_via': rng.choice(self.REPORT_CHANNELS, n).tolist(),
+            'visit_type': rng.choice(self.VISIT_TYPES, n).tolist(),
+            'primary_complaint': rng.choice(self.SYMPTOMS, n).tolist(),
+        }
+        self._pool_index = 0
+
+    def _next_row(self):
+        """Return the pool row for the next event, refilling once the pool is used up"""
+        if self._pool_index >= POOL_SIZE:
+            self._refill_pool()
+        i = self._pool_index
+        self._pool_index += 1
+        return i
 
     def connect_kafka_for_team(self, team_id, bootstrap_server):
         """Initialize Kafka producer for a specific team or shared cluster"""
         max_retries = 5
         retry_delay = 3
+        # Kept short so one unreachable team can't stall startup past the liveness probe
+        connect_timeout = float(os.getenv('KAFKA_CONNECT_TIMEOUT_SEC', '3'))
+
+        # Defaults favour throughput: larger, compressed batches held up to linger.ms
+        acks = os.getenv('PRODUCER_ACKS', '1')
+        config = {
+            'bootstrap.servers': bootstrap_server,
+            'acks': acks,
+            'enable.idempotence': acks in ('all', '-1'),  # librdkafka requires acks=all for idempotence
+            'retries': 3,
+            'max.in.flight.requests.per.connection': 5,
+            'linger.ms': int(os.getenv('PRODUCER_LINGER_MS', '100')),
+            'batch.size': int(os.getenv('PRODUCER_BATCH_SIZE', '131072')),
+            'compression.type': os.getenv('PRODUCER_COMPRESSION', 'lz4'),
+            'delivery.report.only.error': True,
+        }
 
         for attempt in range(max_retries):
             try:
-                producer = KafkaProducer(
-                    bootstrap_servers=[bootstrap_server],
-                    value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                    acks='all',
-                    retries=3,
-                    max_in_flight_requests_per_connection=1,
-                    linger_ms=int(os.getenv('PRODUCER_LINGER_MS', '5')),
-                    batch_size=int(os.getenv('PRODUCER_BATCH_SIZE', '16384'))
-                )
+                producer = Producer(config)
+                # Producer() connects lazily; fetch metadata to confirm the broker is reachable
+                producer.list_topics(timeout=connect_timeout)
                 logger.info(f"Connected to Kafka for {team_id}: {bootstrap_server}")
                 return producer
             except Exception as e:
@@ -153,6 +319,7 @@ class EventGenerator:
             if self.producers:
                 connected_teams = sorted(list(self.producers.keys()))
                 logger.info(f"Successfully connected teams: {', '.join(connected_teams)}")
+            self.topics = {team_id: self._topic_for_team(team_id) for team_id in self.producers}
             return success_count > 0
 
         elif SINGLE_BOOTSTRAP:
@@ -160,6 +327,7 @@ class EventGenerator:
             producer = self.connect_kafka_for_team('shared', SINGLE_BOOTSTRAP)
             if producer:
                 self.producers['shared'] = producer
+                self.topics['shared'] = self._topic_for_team('shared')
                 logger.info("Connected to shared Kafka cluster")
                 return True
             logger.error("Failed to connect to shared Kafka cluster")
@@ -169,63 +337,79 @@ class EventGenerator:
             logger.error("No Kafka configuration provided. Set TEAM_BOOTSTRAP_SERVERS or KAFKA_BOOTSTRAP_SERVERS.")
             return False
 
+    def _next_stream(self):
+        """Pick the stream type for the next event from a pre-drawn batch"""
+        if not self._stream_pool:
+            self._stream_pool = rng.choice(EVENT_STREAMS, POOL_SIZE).tolist()
+        return self._stream_pool.pop()
+
+    def _timestamp(self):
+        """Current UTC time in ISO-8601, reformatting the date/time prefix once per second"""
+        sec, ns = divmod(time.time_ns(), 1_000_000_000)
+        if sec != self._ts_second:
+            self._ts_second = sec
+            self._ts_prefix = datetime.utcfromtimestamp(sec).strftime('%Y-%m-%dT%H:%M:%S.')
+        return f"{self._ts_prefix}{ns // 1000:06d}"
+
     def generate_symptom_report(self):
-        """Generate a synthetic symptom report event"""
-        return {
-            'event_type': 'symptom_report',
-            'timestamp': datetime.utcnow().isoformat(),
-            'patient_id': f"P{random.randint(10000, 99999)}",
-            'age': random.randint(1, 90),
-            'region': random.choice(REGIONS),
-            'symptoms': random.sample(self.SYMPTOMS, random.randint(1, 4)),
-            'severity': random.choice(['mild', 'moderate', 'severe']),
-            'duration_days': random.randint(1, 14),
-            'reported_via': random.choice(['mobile_app', 'web_portal', 'phone_hotline'])
-        }
+        """Generate a synthetic symptom report event and its partition key"""
+        i = self._next_row()
+        pool = self._pool
+        patient_num = pool['patient_id'][i]
+        event = self._symptom_event
+        event['timestamp'] = self._timestamp()
+        event['patient_id'] = f"P{patient_num}"
+        event['age'] = pool['age'][i]
+        event['region'] = pool['region'][i]
+        event['symptoms'] = pool['symptoms'][i][:pool['symptom_count'][i]]
+        event['severity'] = pool['severity'][i]
+        event['duration_days'] = pool['duration_days'][i]
+        event['reported_via'] = pool['reported_via'][i]
+        return event, b"P%d" % patient_num
 
     def generate_clinic_visit(self):
-        """Generate a synthetic clinic visit event"""
-        return {
-            'event_type': 'clinic_visit',
-            'timestamp': datetime.utcnow().isoformat(),
-            'visit_id': f"V{random.randint(100000, 999999)}",
-            'patient_id': f"P{random.randint(10000, 99999)}",
-            'clinic_id': f"C{random.randint(1, 50)}",
-            'region': random.choice(REGIONS),
-            'visit_type': random.choice(self.VISIT_TYPES),
-            'primary_complaint': random.choice(self.SYMPTOMS),
-            'temperature_f': round(random.uniform(97.0, 104.0), 1),
-            'diagnosis_code': f"ICD{random.randint(100, 999)}",
-            'prescribed_medication': random.choice([True, False]),
-            'follow_up_required': random.choice([True, False])
-        }
+        """Generate a synthetic clinic visit event and its partition key"""
+        i = self._next_row()
+        pool = self._pool
+        patient_num = pool['patient_id'][i]
+        event = self._clinic_event
+        event['timestamp'] = self._timestamp()
+        event['visit_id'] = f"V{pool['visit_id'][i]}"
+        event['patient_id'] = f"P{patient_num}"
+        event['clinic_id'] = f"C{pool['clinic_id'][i]}"
+        event['region'] = pool['region'][i]
+        event['visit_type'] = pool['visit_type'][i]
+        event['primary_complaint'] = pool['primary_complaint'][i]
+        event['temperature_f'] = pool['body_temperature_f'][i]
+        event['diagnosis_code'] = f"ICD{pool['diagnosis_code'][i]}"
+        event['prescribed_medication'] = pool['prescribed_medication'][i]
+        event['follow_up_required'] = pool['follow_up_required'][i]
+        return event, b"P%d" % patient_num
 
     def generate_environmental_condition(self):
-        """Generate a synthetic environmental conditions event"""
-        return {
-            'event_type': 'environmental_conditions',
-            'timestamp': datetime.utcnow().isoformat(),
-            'region': random.choice(REGIONS),
-            'station_id': f"S{random.randint(1, 20)}",
-            'temperature_f': round(random.uniform(20.0, 95.0), 1),
-            'humidity_percent': random.randint(30, 95),
-            'air_quality_index': random.randint(0, 200),
-            'pollen_count': random.randint(0, 500),
-            'uv_index': random.randint(0, 11),
-            'wind_speed_mph': round(random.uniform(0, 25), 1)
-        }
+        """Generate a synthetic environmental conditions event and its partition key"""
+        i = self._next_row()
+        pool = self._pool
+        station_num = pool['station_id'][i]
+        event = self._environment_event
+        event['timestamp'] = self._timestamp()
+        event['region'] = pool['region'][i]
+        event['station_id'] = f"S{station_num}"
+        event['temperature_f'] = pool['air_temperature_f'][i]
+        event['humidity_percent'] = pool['humidity_percent'][i]
+        event['air_quality_index'] = pool['air_quality_index'][i]
+        event['pollen_count'] = pool['pollen_count'][i]
+        event['uv_index'] = pool['uv_index'][i]
+        event['wind_speed_mph'] = pool['wind_speed_mph'][i]
+        return event, b"S%d" % station_num
 
     def generate_event(self, stream_type):
-        """Generate an event based on stream type"""
-        if stream_type == 'symptom_report':
-            return self.generate_symptom_report()
-        elif stream_type == 'clinic_visit':
-            return self.generate_clinic_visit()
-        elif stream_type == 'environmental_conditions':
-            return self.generate_environmental_condition()
-        else:
+        """Generate an (event, partition key bytes) pair based on stream type"""
+        generator = self._generators.get(stream_type)
+        if generator is None:
             logger.warning(f"Unknown stream type: {stream_type}")
-            return None
+            return None, None
+        return generator()
 
     def _topic_for_team(self, team_id: str) -> str:
         if EXPLICIT_TOPIC:
@@ -234,6 +418,74 @@ class EventGenerator:
             return f"{TOPIC_PREFIX}{TOPIC_SUFFIX}"
         return f"{TOPIC_PREFIX}{team_id}{TOPIC_SUFFIX}"
 
+    def _delivery_callback(self, index):
+        """Build a delivery report callback that counts failed deliveries for a team"""
+        team_id = self._teams[index]
+        failed = self._failed
+
+        def on_delivery(err, msg):
+            if err is not None:
+                failed[index] += 1
+
+                # Log every 10th failure to avoid spam
+                if failed[index] % 10 == 1:
+                    logger.error(f"Delivery to {team_id} failed (failure #{failed[index]}): {err}")
+        return on_delivery
+
+    def send_worker(self, index):
+        """Per-team send loop - drains the team's queue into its producer"""
+        team_id = self._teams[index]
+        producer = self.producers[team_id]
+        topic = self.topics[team_id]
+        queue = self.queues[team_id]
+        failed = self._failed
+        on_delivery = self._delivery_callback(index)
+
+        while True:
+            item = queue.get()
+            if item is None:  # Shutdown sentinel from stop()
+                break
+
+            payload, key_bytes = item
+            while True:
+                try:
+                    producer.produce(topic, value=payload, key=key_bytes, on_delivery=on_delivery)
+                    break
+                except BufferError:
+                    # librdkafka's local queue is full: wait for deliveries to free space and
+                    # retry. Only this team's queue backs up; once it is full the generator
+                    # drops this team's events and keeps feeding the others.
+                    # Once stopping, drop instead so shutdown isn't held by a dead broker.
+                    if not self.running:
+                        failed[index] += 1
+                        break
+                    producer.poll(0.5)
+                except Exception as e:
+                    failed[index] += 1
+
+                    # Log every 10th failure to avoid spam
+                    if failed[index] % 10 == 1:
+                        logger.error(f"Error sending to {team_id} (failure #{failed[index]}): {e}")
+                    break
+
+            # Serve delivery callbacks without blocking
+            producer.poll(0)
+
+    def _failure_totals(self):
+        """Cumulative send failures plus queue-full drops per team, aligned with _teams"""
+        return [f + d for f, d in zip(self._failed, self._dropped)]
+
+    def _log_failed_sends(self, label='Failed sends'):
+        """Log per-team failures since the last call, if there were any"""
+        snapshot = self._failure_totals()
+        if sum(snapshot) != sum(self._failures_logged):
+            failed_sends = {
+                team_id: n - prev
+                for team_id, n, prev in zip(self._teams, snapshot, self._failures_logged) if n != prev
+            }
+            logger.warning(f"{label}: {failed_sends}")
+            self._failures_logged = snapshot
+
     def produce_events(self):
         """Main event production loop - sends events to all configured producers"""
         logger.info(f"Starting event production for {len(self.producers)} producer(s)")
@@ -242,70 +494,76 @@ class EventGenerator:
             rate_desc += " per team"
         logger.info(f"Event rate: {rate_desc}")
         logger.info(f"Event streams: {EVENT_STREAMS}")
+        logger.info(f"Event format: {EVENT_FORMAT}")
 
-        # Calculate sleep interval per loop iteration
+        # Calculate pacing: send events in batches of ~1% of the rate, then sleep
+        # until the next scheduled tick so per-event sleep overhead is amortized
         effective_rate = EVENT_RATE_PER_SEC
         if RATE_PER_TEAM and len(self.producers) > 0:
             effective_rate = EVENT_RATE_PER_SEC
-        sleep_interval = 1.0 / max(effective_rate, 0.001)
+        events_per_tick = max(1, int(effective_rate / 100))
+        tick_interval = events_per_tick / max(effective_rate, 0.001)
         event_count = 0
-        failed_sends = {}  # Track failures per team
+        dropped = self._dropped
+
+        # Each team's sender thread pulls from its own queue
+        # Never block on a full queue, so one stalled team can't stop the others
+        queue_puts = [queue.put_nowait for queue in self.queues.values()]
+        destination_count = len(queue_puts)
+        destination_names = ', '.join(sorted(self.producers))
+
+        # Bind attributes and module globals used per event to locals; self.running is
+        # still read on every tick so stop() takes effect
+        next_stream = self._next_stream
+        generate_event = self.generate_event
+        encode_event = _encode_event
+        monotonic = time.monotonic
+        perf_counter = time.perf_counter
+        sleep = time.sleep
+
+        # Ticks are scheduled on the monotonic clock so sleep overshoot doesn't accumulate
+        next_tick = monotonic()
+        last_log_time = perf_counter()
 
         while self.running:
             try:
-                # Generate one event
-                stream_type = random.choice(EVENT_STREAMS)
-                event = self.generate_event(stream_type)
+                for _ in range(events_per_tick):
+                    # Generate one event
+                    event, key_bytes = generate_event(next_stream())
 
-                if event:
-                    # Common metadata
-                    event['source'] = 'event-generator'
-                    event['schema_version'] = '1.0'
+                    if not event:
+                        continue
 
-                    # Send same event to all teams
-                    for team_id, producer in self.producers.items():
-                        topic = self._topic_for_team(team_id)
+                    # Serialize once; the same bytes are sent to every team
+                    payload = encode_event(event)
 
+                    # Hand the same event to every team's sender thread
+                    item = (payload, key_bytes)
+                    for index, put in enumerate(queue_puts):
                         try:
-                            # Use a key for partitioning when patient_id or visit_id exists
-                            key_field = event.get('patient_id') or event.get('visit_id') or event.get('station_id')
-                            key_bytes = str(key_field).encode('utf-8') if key_field else None
-                            producer.send(topic, value=event, key=key_bytes)
-
-                            # Reset failure count on success
-                            if team_id in failed_sends:
-                                del failed_sends[team_id]
-
-                        except Exception as e:
-                            failed_sends[team_id] = failed_sends.get(team_id, 0) + 1
-
-                            # Log every 10th failure to avoid spam
-                            if failed_sends[team_id] % 10 == 1:
-                                logger.error(f"Error sending to {team_id} (failure #{failed_sends[team_id]}): {e}")
+                            put(item)
+                        except Full:
+                            dropped[index] += 1
 
                     event_count += 1
 
-                    # Flush producers every 100 events to ensure delivery
-                    if event_count % 100 == 0:
-                        for team_id, producer in self.producers.items():
-                            try:
-                                producer.flush(timeout=5)
-                            except Exception as e:
-                                logger.error(f"Error flushing producer for {team_id}: {e}")
-                                failed_sends[team_id] = failed_sends.get(team_id, 0) + 1
-
-                        # Log basic stats every 100 events
-                        logger.info(f"Produced {event_count} events to {len(self.producers)} destination(s)")
-
-                        # Log team names every 500 events for verification
-                        if event_count % 500 == 0:
-                            team_list = sorted(list(self.producers.keys()))
-                            logger.info(f"Active destinations: {', '.join(team_list)}")
+                # Delivery is left to linger_ms/batch_size; stats are logged on a timer
+                now = perf_counter()
+                if now - last_log_time >= STATS_LOG_INTERVAL_SEC:
+                    last_log_time = now
+                    logger.info(f"Produced {event_count} events to {destination_count} destination(s)")
+                    logger.info(f"Active destinations: {destination_names}")
 
-                        if failed_sends:
-                            logger.warning(f"Failed sends: {failed_sends}")
+                    # Worker counters are only read here; report what changed since the last log
+                    self._log_failed_sends()
 
-                time.sleep(sleep_interval)
+                next_tick += tick_interval
+                delay = next_tick - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                else:
+                    # Fell behind (e.g. after an error pause); resync rather than burst to catch up
+                    next_tick = monotonic()
 
             except Exception as e:
                 logger.error(f"Error in production loop: {e}")
@@ -318,19 +576,73 @@ class EventGenerator:
             return False
 
         self.running = True
-        Thread(target=self.produce_events, daemon=True).start()
+
+        # One sender thread per team; the generator never blocks on a team's queue, so a
+        # slow cluster only drops its own events instead of holding up the others.
+        # Failure counters are flat lists indexed by worker, so no dict is touched per send;
+        # each list has a single writer thread.
+        self._teams = list(self.producers)
+        self._failed[:] = [0] * len(self._teams)
+        self._dropped[:] = [0] * len(self._teams)
+        self._failures_logged = [0] * len(self._teams)
+        for index, team_id in enumerate(self._teams):
+            self.queues[team_id] = Queue(maxsize=SEND_QUEUE_SIZE)
+            worker = Thread(target=self.send_worker, args=(index,), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        self.production_thread = Thread(target=self.produce_events, daemon=True)
+        self.production_thread.start()
         logger.info("Event generator started")
         return True
 
-    def stop(self):
-        """Stop the event generator"""
+    def _flush_producer(self, team_id, producer, timeout):
+        """Flush one producer, logging anything still undelivered"""
+        try:
+            remaining = producer.flush(timeout=timeout)
+            if remaining:
+                logger.warning(f"{remaining} message(s) for {team_id} were not delivered before shutdown")
+            logger.info(f"Flushed producer for {team_id}")
+        except Exception as e:
+            logger.error(f"Error flushing producer for {team_id}: {e}")
+
+    def stop(self, timeout=STOP_TIMEOUT_SEC):
+        """Stop the event generator, finishing within timeout seconds overall"""
         self.running = False
-        for team_id, producer in self.producers.items():
+        deadline = time.monotonic() + timeout
+
+        def time_left():
+            return max(0.0, deadline - time.monotonic())
+
+        # Let the production thread finish its current tick before the sentinels go in,
+        # so no events are queued behind them
+        if self.production_thread is not None:
+            self.production_thread.join(timeout=time_left())
+            if self.production_thread.is_alive():
+                logger.warning("Production thread did not stop before the shutdown deadline")
+
+        for team_id, queue in self.queues.items():
             try:
-                producer.close()
-                logger.info(f"Closed producer for {team_id}")
-            except Exception as e:
-                logger.error(f"Error closing producer for {team_id}: {e}")
+                queue.put(None, timeout=time_left())
+            except Full:
+                logger.warning(f"Could not signal sender for {team_id} before the shutdown deadline")
+        for worker in self.workers:
+            worker.join(timeout=time_left())
+
+        # Flush all producers in parallel so one slow broker doesn't use up the others' time
+        flush_timeout = time_left()
+        flushers = [
+            Thread(target=self._flush_producer, args=(team_id, producer, flush_timeout), daemon=True)
+            for team_id, producer in self.producers.items()
+        ]
+        for flusher in flushers:
+            flusher.start()
+        for flusher in flushers:
+            flusher.join(timeout=time_left() + 1)
+
+        # The production thread has exited, so report failures from the final tick and
+        # events dropped while draining
+        self._log_failed_sends('Failed sends during shutdown')
         logger.info("Event generator stopped")
 
 
@@ -341,6 +653,10 @@ def main():
         logger.error("Set TEAM_BOOTSTRAP_SERVERS for multi-team or KAFKA_BOOTSTRAP_SERVERS for single-cluster mode.")
         return 1
 
+    if EVENT_FORMAT not in SUPPORTED_FORMATS:
+        logger.error(f"Unsupported EVENT_FORMAT '{EVENT_FORMAT}'. Use one of: {', '.join(SUPPORTED_FORMATS)}")
+        return 1
+
     generator = EventGenerator()
 
     if not generator.start():
@@ -349,7 +665,21 @@ def main():
 
     # Start health check server
     logger.info("Starting health check server on port 8000")
-    app.run(host='0.0.0.0', port=8000)
+    server = ThreadingHTTPServer(('0.0.0.0', 8000), HealthHandler)
+
+    def handle_shutdown(signum, frame):
+        """Stop generating and flush producers before the pod is terminated"""
+        logger.info(f"Received {signal.Signals(signum).name}, shutting down")
+        generator.stop()
+        # shutdown() waits for serve_forever(), which runs on this thread, so call it from another
+        Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+
+    server.serve_forever()
+    server.server_close()
+    return 0
 
 
 if __name__ == '__main__':